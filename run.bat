@@ -10,6 +10,7 @@ IF %video_resolution%==%mask_resolution% (
   START /wait /b powershell.exe -ExecutionPolicy Bypass -File .\scripts\01_audio_extract.ps1
   START /wait /b powershell.exe -ExecutionPolicy Bypass -File .\scripts\02_frame_extract.ps1
   START /wait /b powershell.exe -ExecutionPolicy Bypass -File .\scripts\03_frame_clean.ps1
+  IF ERRORLEVEL 1 goto FAILED
   START /wait /b powershell.exe -ExecutionPolicy Bypass -File .\scripts\04_frame_merge.ps1
   START /wait /b powershell.exe -ExecutionPolicy Bypass -File .\scripts\05_audio_merge.ps1
 
@@ -23,6 +24,11 @@ IF %video_resolution%==%mask_resolution% (
 ) ELSE (
   echo "video and mask resolution must be exact same"
 )
+goto NO
+
+:FAILED
+echo "some frames could not be cleaned, see the error above. temp folder is kept."
+echo "to clean only the missing frames, run 'python .\scripts\batch.py' here, then scripts 04_frame_merge.ps1 and 05_audio_merge.ps1."
 
 :NO
 pause
\ No newline at end of file
@@ -1 +1,2 @@
-python .\scripts\batch.py
\ No newline at end of file
+python .\scripts\batch.py
+exit $LASTEXITCODE
\ No newline at end of file
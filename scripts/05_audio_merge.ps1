@@ -1,4 +1,6 @@
-$codec = .\ffmpeg\bin\ffprobe -v error -select_streams a:0 -show_entries stream=codec_name -of default=noprint_wrappers=1:nokey=1 .\video.mp4
-$codec = $codec.Substring(0,3)
-if ($codec -eq "vor") {$codec = "ogg"}
-./ffmpeg/bin/ffmpeg -i ./temp/video_cleaned.mp4 -i ./temp/audio.$codec -c:v copy -map 0:v -map 1:a -y ./output/video_final.mp4 
\ No newline at end of file
+$audio = Get-ChildItem -Path .\temp -Filter "audio.*" | Select-Object -First 1
+if ($audio) {
+  ./ffmpeg/bin/ffmpeg -i ./temp/video_cleaned.mp4 -i $audio.FullName -c:v copy -map 0:v -map 1:a -y ./output/video_final.mp4
+} else {
+  Move-Item -Path .\temp\video_cleaned.mp4 -Destination .\output\video_final.mp4 -Force
+}
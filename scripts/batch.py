@@ -1,93 +1,197 @@
 import requests
 import os
-from multiprocessing import Process
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from urllib3.filepost import choose_boundary, encode_multipart_formdata
 
 directory = './temp/input'
+output_directory = './temp/output'
 
 mask_path = "mask.png"
 mask = open(mask_path, "rb").read()
+mask_part = ("mask.png", mask, "image/png")
 
 url = "http://127.0.0.1:8080/inpaint"
 
-files = []
-
-for filename in os.listdir(directory):
-    f = os.path.join(directory, filename)
-    if os.path.isfile(f):
-        files.append(f)
-
-# Print iterations progress
-def printProgressBar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 100, fill = '█', printEnd = "\r"):
-    percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
-    filledLength = int(length * iteration // total)
-    bar = fill * filledLength + '-' * (length - filledLength)
-    print(f'\r{prefix} |{bar}| {percent}% {suffix}', end = printEnd)
-    # Print New Line on Complete
-    if iteration == total: 
-        print()
-
-def batch(start, end):
-    printProgressBar(0, end, prefix = 'cleaning extracted frames...', suffix = 'Complete', length = 50)
-    for i in range(start, end):
-        img_path = files[i]
-        # print(img_path)
-        image = open(img_path, "rb").read()
-
-        response = requests.post(
-            url,
-            files={"image": image, "mask": mask},
-            data={
-                "ldmSteps": 25,
-                "ldmSampler": "plms",
-                "hdStrategy": "Original",
-                "zitsWireframe": False,
-                "hdStrategyCropMargin": 128,
-                "hdStrategyCropTrigerSize": 512,
-                "hdStrategyResizeLimit": 1280,
-                "prompt": "",
-                "negativePrompt": "",
-                "useCroper": False,
-                "croperX": 0,
-                "croperY": 0,
-                "croperHeight": 512,
-                "croperWidth": 512,
-                "sdScale": 1.0,
-                "sdMaskBlur": 0,
-                "sdStrength": 0.75,
-                "sdSteps": 50,
-                "sdGuidanceScale": 7.5,
-                "sdSampler": "uni_pc",
-                "sdSeed": 42,
-                "sdMatchHistograms": False,
-                "cv2Flag": "INPAINT_NS",
-                "cv2Radius": 4,
-                "paintByExampleSteps": 50,
-                "paintByExampleGuidanceScale": 7.5,
-                "paintByExampleMaskBlur": 0,
-                "paintByExampleSeed": 42,
-                "paintByExampleMatchHistograms": False,
-                "paintByExampleExampleImage": None,
-                "p2pSteps": 50,
-                "p2pImageGuidanceScale": 7.5,
-                "p2pGuidanceScale": 7.5,
-                "controlnet_conditioning_scale": 0.4,
-                "controlnet_method": "control_v11p_sd15_canny",
-                "paint_by_example_example_image": None,
-            },
-        )
-
-        splitFilename = files[i].split('\\')[1]
-        with open(f"./temp/output/{splitFilename}", "wb") as f:
-            f.write(response.content)
-        printProgressBar(i, end, prefix = 'cleaning extracted frames...', suffix = 'Complete', length = 50)
+data = {
+    "ldmSteps": 25,
+    "ldmSampler": "plms",
+    "hdStrategy": "Original",
+    "zitsWireframe": False,
+    "hdStrategyCropMargin": 128,
+    "hdStrategyCropTrigerSize": 512,
+    "hdStrategyResizeLimit": 1280,
+    "prompt": "",
+    "negativePrompt": "",
+    "useCroper": False,
+    "croperX": 0,
+    "croperY": 0,
+    "croperHeight": 512,
+    "croperWidth": 512,
+    "sdScale": 1.0,
+    "sdMaskBlur": 0,
+    "sdStrength": 0.75,
+    "sdSteps": 50,
+    "sdGuidanceScale": 7.5,
+    "sdSampler": "uni_pc",
+    "sdSeed": 42,
+    "sdMatchHistograms": False,
+    "cv2Flag": "INPAINT_NS",
+    "cv2Radius": 4,
+    "paintByExampleSteps": 50,
+    "paintByExampleGuidanceScale": 7.5,
+    "paintByExampleMaskBlur": 0,
+    "paintByExampleSeed": 42,
+    "paintByExampleMatchHistograms": False,
+    "paintByExampleExampleImage": None,
+    "p2pSteps": 50,
+    "p2pImageGuidanceScale": 7.5,
+    "p2pGuidanceScale": 7.5,
+    "controlnet_conditioning_scale": 0.4,
+    "controlnet_method": "control_v11p_sd15_canny",
+    "paint_by_example_example_image": None,
+}
+
+# Everything but the frame is the same for every request, so the multipart body is encoded once
+# (dropping None fields and str()-ing the rest, as requests does) and each frame is spliced in
+frameMarker = choose_boundary().encode()
+body, contentType = encode_multipart_formdata(
+    [(key, str(value)) for key, value in data.items() if value is not None]
+    + [("mask", mask_part), ("image", ("image.jpg", frameMarker, "image/jpeg"))]
+)
+bodyPrefix, bodySuffix = body.split(frameMarker)
+headers = {"Content-Type": contentType}
+
+# Frames posted to lama-cleaner at the same time. lama-cleaner doesn't queue requests: each one runs
+# its own full-resolution model call on the GPU at once, so every extra frame in flight costs another
+# frame's worth of VRAM, and a CUDA out-of-memory comes back as a 500. Two is enough to overlap one
+# frame's upload/download with the other's inference. Override with the LAMA_MAX_IN_FLIGHT
+# environment variable; use 1 for diffusion models, which share scheduler state between calls.
+MAX_IN_FLIGHT = max(1, int(os.environ.get("LAMA_MAX_IN_FLIGHT", 2)))
+# Frames each request thread keeps read ahead from disk
+READ_AHEAD = 4
+
+# An output newer than its input frame was finished by an earlier, interrupted run and is kept, so
+# rerunning this script resumes. Frames re-extracted for a new task are newer and get cleaned again.
+# A missing output folder just means nothing is cleaned yet; .part files are writes that were cut off.
+os.makedirs(output_directory, exist_ok=True)
+cleaned = {}
+with os.scandir(output_directory) as entries:
+    for entry in entries:
+        if not entry.is_file():
+            continue
+        if entry.name.endswith(".part"):
+            os.remove(entry.path)
+        elif entry.stat().st_size > 0:
+            cleaned[entry.name] = entry.stat().st_mtime
+
+with os.scandir(directory) as entries:
+    files = [(entry.path, entry.name) for entry in entries if entry.is_file() and cleaned.get(entry.name, -1) <= entry.stat().st_mtime]
+
+# tqdm's own counter update isn't atomic across the writer threads
+progressLock = threading.Lock()
+
+# cap on responses waiting for the writer; each one holds its connection open until save() drains it
+writeSlots = threading.Semaphore(MAX_IN_FLIGHT * 2)
+# (frame index, error) for frames that could not be read, inpainted or written
+failures = []
+# set on the first 500 from lama-cleaner; from then on frames are posted one at a time
+serialMode = threading.Event()
+serialLock = threading.Lock()
+
+def save(i, response, progress):
+    path = os.path.join(output_directory, files[i][1])
+    try:
+        # copy the body straight from the socket instead of materialising response.content,
+        # into a .part file so an interrupted write never looks like a finished frame
+        with response, open(path + ".part", "wb") as f:
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, f, 1 << 20)
+        os.replace(path + ".part", path)
+    except Exception as error:
+        failures.append((i, error))
+        return
+    finally:
+        writeSlots.release()
+    with progressLock:
+        progress.update(1)
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def post(session, image):
+    response = session.post(
+        url,
+        data=bodyPrefix + image + bodySuffix,
+        headers=headers,
+        stream=True,
+    )
+    if not response.ok:
+        # give the streamed connection back before failing the frame
+        response.close()
+        response.raise_for_status()
+    return response
+
+def isServerError(error):
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 500
+
+def batch(indices, progress, reader, writer):
+    # one keep-alive connection per thread instead of a new one per frame
+    with requests.Session() as session:
+        # read upcoming frames from disk while the current one is being inpainted
+        pending = deque(reader.submit(read, files[i][0]) for i in indices[:READ_AHEAD])
+        for n, i in enumerate(indices):
+            image = pending.popleft()
+            if n + READ_AHEAD < len(indices):
+                pending.append(reader.submit(read, files[indices[n + READ_AHEAD]][0]))
+
+            # a failed frame is recorded and skipped, so one bad response doesn't drop the rest of the slice
+            try:
+                if serialMode.is_set():
+                    with serialLock:
+                        response = post(session, image.result())
+                else:
+                    response = post(session, image.result())
+            except Exception as error:
+                if isServerError(error):
+                    serialMode.set()
+                failures.append((i, error))
+                continue
+
+            writeSlots.acquire()
+            writer.submit(save, i, response, progress)
+
+def clean(slices, progress):
+    with ThreadPoolExecutor(max_workers=len(slices) * READ_AHEAD) as reader, \
+            ThreadPoolExecutor(max_workers=len(slices)) as writer, \
+            ThreadPoolExecutor(max_workers=len(slices)) as workers:
+        futures = [workers.submit(batch, indices, progress, reader, writer) for indices in slices]
+    for future in futures:
+        future.result()
+
+def run(start, end):
+    total = end - start
+    if total == 0:
+        return
+    # split the frames into one contiguous slice per in-flight request
+    step = max(1, -(-total // MAX_IN_FLIGHT))
+    with tqdm(total=total, desc='cleaning extracted frames') as progress:
+        clean([range(s, min(s + step, end)) for s in range(start, end, step)], progress)
+        # frames that got a 500 while others were on the GPU get one more try, posted one at a time
+        retry = [i for i, error in failures if isServerError(error)]
+        if MAX_IN_FLIGHT > 1 and retry:
+            failures[:] = [(i, error) for i, error in failures if not isServerError(error)]
+            clean([retry], progress)
+    # fail only after every other frame is done, so a rerun resumes with just the missing ones
+    if failures:
+        names = ", ".join(files[i][1] for i, _ in failures[:10])
+        raise RuntimeError(f"{len(failures)} frame(s) could not be cleaned, e.g. {names}; first error: {failures[0][1]}")
 
 if __name__ == "__main__":
     print("\n")
     START, END = 0, len(files)
-    th1 = Process(target=batch, args=(START, END))
-    # th2 = Process(target=batch, args=(END//2, END))
-
-    th1.start()
-    # th2.start()
-    th1.join()
-    # th2.join()
\ No newline at end of file
+    run(START, END)
\ No newline at end of file